@@ -1,5 +1,17 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterator, Optional
+
 import streamlit as st
-from langchain_core.messages import HumanMessage, AIMessage
+import tiktoken
 
 # Import our custom modules
 from database_utils import DatabaseManager
@@ -20,83 +32,273 @@ st.set_page_config(
 st.title("🤖 NL2SQL Chatbot")
 st.markdown("Ask me questions about your database in natural language!")
 
-# --- Initialize Session State ---
-# This helps prevent re-initializing heavy objects (like LLM chains) on every rerun.
-if "db_manager" not in st.session_state:
+# --- Shared Resources ---
+# st.cache_resource keeps a single instance of each heavy object in process memory,
+# shared across all sessions and reruns, so the DB handshake and LLM client setup happen once.
+@st.cache_resource
+def get_db_manager() -> DatabaseManager:
+    """Creates the process-wide DatabaseManager."""
+    db_manager = DatabaseManager()
+    logger.info("DatabaseManager initialized in resource cache.")
+    return db_manager
+
+@st.cache_resource
+def get_langchain_db(_db_manager: DatabaseManager):
+    """Returns the Langchain SQLDatabase owned by the shared DatabaseManager."""
+    langchain_db = _db_manager.get_langchain_db()
+    logger.info("Langchain SQLDatabase initialized in resource cache.")
+    return langchain_db
+
+@st.cache_resource
+def get_chain(_db) -> NL2SQLChainManager:
+    """Creates the process-wide NL2SQLChainManager."""
+    chain = NL2SQLChainManager(_db)
+    logger.info("NL2SQLChainManager initialized in resource cache.")
+    return chain
+
+# Number of chat messages kept in history (5 user, 5 AI)
+MAX_HISTORY_MESSAGES = 10
+
+# Maximum number of tokens of earlier conversation sent to the LLM with each question
+HISTORY_TOKEN_BUDGET = 2048
+
+# Directory holding one chat history checkpoint per session, so history survives page reloads
+CHAT_HISTORY_DIR = "chat_history"
+
+# Checkpoints (and stray temp files) untouched for this many days are deleted
+CHAT_HISTORY_RETENTION_DAYS = 7
+
+# Session ids are uuid4 hex strings; anything else in the URL is replaced with a fresh id
+SESSION_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# Upper bound on the number of distinct answers kept in the shared answer cache
+ANSWER_CACHE_MAX_ENTRIES = 256
+
+# Seconds a cached answer stays valid; the database behind it can change
+ANSWER_CACHE_TTL_SECONDS = 3600
+
+@st.cache_resource
+def _answer_cache() -> tuple:
+    """
+    Process-wide LRU store of completed answers keyed on (prompt, history_key),
+    with values stored as (timestamp, answer), plus the lock guarding it.
+    st.cache_data cannot memoize a generator, so streamed answers are cached here instead.
+    The store is shared by every session's script thread, so it is only accessed under the lock.
+    """
+    return OrderedDict(), threading.Lock()
+
+def _get_cached_answer(key: tuple) -> Optional[str]:
+    """
+    Returns the cached answer for `key`, or None if there is none or it has expired.
+    """
+    cache, lock = _answer_cache()
+    with lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        timestamp, answer = entry
+        if time.monotonic() - timestamp > ANSWER_CACHE_TTL_SECONDS:
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return answer
+
+def _store_answer(key: tuple, answer: str) -> None:
+    """
+    Stores a completed answer, evicting the least recently used entry once the cache is full.
+    """
+    cache, lock = _answer_cache()
+    with lock:
+        cache[key] = (time.monotonic(), answer)
+        cache.move_to_end(key)
+        if len(cache) > ANSWER_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+def _stream_answer(prompt: str, history_key: tuple, chain: NL2SQLChainManager) -> Iterator[str]:
+    """
+    Yields the answer for a (prompt, history) pair. A cached answer is replayed in one chunk,
+    skipping the LLM round-trip; otherwise the chain's output is streamed and the complete
+    answer is stored for the next identical question.
+    """
+    key = (prompt, history_key)
+    cached_answer = _get_cached_answer(key)
+    if cached_answer is not None:
+        logger.info("Answer served from cache.")
+        yield cached_answer
+        return
+
+    # Langchain message classes are only needed when the LLM is actually called
+    from langchain_core.messages import HumanMessage, AIMessage
+
+    chat_history = [
+        HumanMessage(content=content) if role == "user" else AIMessage(content=content)
+        for role, content in history_key
+    ]
+    chunks = []
+    for chunk in chain.stream_query(prompt, chat_history):
+        chunks.append(chunk)
+        yield chunk
+    _store_answer(key, "".join(chunks))
+
+@st.cache_resource
+def _get_token_encoder() -> tiktoken.Encoding:
+    """Loads the tiktoken encoding used to measure chat history once per process."""
+    return tiktoken.get_encoding("cl100k_base")
+
+def _truncate_by_tokens(messages: tuple, max_tokens: int = HISTORY_TOKEN_BUDGET) -> tuple:
+    """
+    Returns the most recent (role, content) messages whose combined token count fits in
+    `max_tokens`, so the prompt sent to the LLM stays bounded however long the messages are.
+    """
+    encoder = _get_token_encoder()
+    total_tokens = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        total_tokens += len(encoder.encode(messages[i][1]))
+        if total_tokens > max_tokens:
+            break
+        start = i
+    return messages[start:]
+
+def _history_session_id() -> str:
+    """
+    Returns the id that keys this browser session's chat history checkpoint.
+    The id is kept in the URL query parameters so that a page reload, which starts a fresh
+    session_state, finds the same checkpoint, while other users and tabs get their own.
+    """
+    session_id = st.query_params.get("sid", "")
+    if not SESSION_ID_PATTERN.fullmatch(session_id):
+        session_id = uuid.uuid4().hex
+        st.query_params["sid"] = session_id
+    return session_id
+
+def _history_path(session_id: str) -> str:
+    """Returns the checkpoint file for a session's chat history."""
+    return os.path.join(CHAT_HISTORY_DIR, f"{session_id}.json")
+
+def _persist_history(session_id: str, messages) -> None:
+    """
+    Checkpoints a session's chat history as a single JSON document.
+    The data is written to a uniquely named temporary file and atomically renamed over the
+    old checkpoint, so a crash or a concurrent write never leaves a torn file behind.
+    """
+    tmp_path = None
+    try:
+        os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CHAT_HISTORY_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(list(messages)))
+        os.replace(tmp_path, _history_path(session_id))
+    except OSError as e:
+        logger.error(f"Failed to persist chat history: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _load_history(session_id: str) -> list:
+    """
+    Loads a session's checkpointed chat history as a list of (role, content) tuples.
+    Returns an empty list if there is no checkpoint or it cannot be read.
+    """
+    history_path = _history_path(session_id)
+    if not os.path.exists(history_path):
+        return []
     try:
-        st.session_state.db_manager = DatabaseManager()
-        st.session_state.langchain_sql_db = st.session_state.db_manager.get_langchain_db()
-        logger.info("DatabaseManager and Langchain SQLDatabase initialized in session state.")
-    except Exception as e:
-        st.error(f"Failed to connect to the database: {e}")
-        logger.critical(f"Failed to initialize DatabaseManager: {e}", exc_info=True)
-        st.stop() # Stop the app if DB connection fails
-
-if "nl2sql_chain" not in st.session_state:
+        with open(history_path, encoding="utf-8") as f:
+            history = [(role, content) for role, content in json.load(f)]
+        if any(role not in ("user", "assistant") or not isinstance(content, str) for role, content in history):
+            raise ValueError("unexpected message in checkpoint")
+        return history
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable chat history checkpoint: {e}")
+        return []
+
+def _purge_expired_histories() -> None:
+    """
+    Deletes chat history checkpoints and leftover temp files that have not been written
+    for CHAT_HISTORY_RETENTION_DAYS, so conversations do not accumulate on disk indefinitely.
+    """
+    if not os.path.isdir(CHAT_HISTORY_DIR):
+        return
+    cutoff = time.time() - CHAT_HISTORY_RETENTION_DAYS * 24 * 60 * 60
     try:
-        st.session_state.nl2sql_chain = NL2SQLChainManager(st.session_state.langchain_sql_db)
-        logger.info("NL2SQLChainManager initialized in session state.")
-    except Exception as e:
-        st.error(f"Failed to initialize the NL2SQL chain: {e}")
-        logger.critical(f"Failed to initialize NL2SQLChainManager: {e}", exc_info=True)
-        st.stop() # Stop the app if LLM chain fails
+        with os.scandir(CHAT_HISTORY_DIR) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+    except OSError as e:
+        logger.warning(f"Failed to purge expired chat history checkpoints: {e}")
+
+try:
+    db_manager = get_db_manager()
+    langchain_sql_db = get_langchain_db(db_manager)
+except Exception as e:
+    st.error(f"Failed to connect to the database: {e}")
+    logger.critical(f"Failed to initialize DatabaseManager: {e}", exc_info=True)
+    st.stop() # Stop the app if DB connection fails
 
+try:
+    nl2sql_chain = get_chain(langchain_sql_db)
+except Exception as e:
+    st.error(f"Failed to initialize the NL2SQL chain: {e}")
+    logger.critical(f"Failed to initialize NL2SQLChainManager: {e}", exc_info=True)
+    st.stop() # Stop the app if LLM chain fails
+
+# --- Initialize Session State ---
+# Chat history is per-user, so it stays in session state.
+session_id = _history_session_id()
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    # Starting a session is also when expired checkpoints from other sessions are cleaned up
+    _purge_expired_histories()
+    # A bounded deque keeps the last 10 messages (5 user, 5 AI); older ones are evicted automatically
+    # It is seeded once per session from the last checkpoint on disk.
+    st.session_state.messages = deque(_load_history(session_id), maxlen=MAX_HISTORY_MESSAGES)
     logger.info("Chat history initialized in session state.")
 
 # --- Display Chat Messages ---
-for message in st.session_state.messages:
-    if isinstance(message, HumanMessage):
-        with st.chat_message("user"):
-            st.markdown(message.content)
-    elif isinstance(message, AIMessage):
-        with st.chat_message("assistant"):
-            st.markdown(message.content)
+# Consecutive messages from the same role share one chat_message and one markdown element.
+for role, group in groupby(st.session_state.messages, key=itemgetter(0)):
+    with st.chat_message(role):
+        st.markdown("\n\n---\n\n".join(content for _, content in group))
 
 # --- User Input and Processing ---
 if prompt := st.chat_input("Ask a question about your database..."):
-    # Add user message to chat history
-    st.session_state.messages.append(HumanMessage(content=prompt))
-    with st.chat_message("user"):
-        st.markdown(prompt)
+    # A re-submit interrupts the run that is answering, leaving its prompt unanswered at the
+    # end of the history (and already displayed above). A re-fired identical submission answers
+    # that pending prompt instead of adding it to the history a second time.
+    if st.session_state.messages and st.session_state.messages[-1] == ("user", prompt):
+        logger.info("Re-submitted unanswered prompt; answering it without duplicating it in history.")
+    else:
+        # Add user message to chat history
+        st.session_state.messages.append(("user", prompt))
+        with st.chat_message("user"):
+            st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                # Pass the current query and the full chat history to the NL2SQLChainManager
-                # We slice the history to exclude the *current* user prompt, as it's already handled
-                # by the 'question' input to the chain. The chat_history should contain previous turns.
-                # Limit chat_history to the last 10 messages (5 user, 5 AI) for context
-                context_history = st.session_state.messages[:-1] # Exclude current HumanMessage
-                if len(context_history) > 10: # Keep only the last 10 messages (5 pairs)
-                    context_history = context_history[-10:]
-
-                response = st.session_state.nl2sql_chain.process_query(
-                    natural_language_query=prompt,
-                    chat_history=context_history
-                )
-                st.markdown(response)
-                st.session_state.messages.append(AIMessage(content=response))
-
-                # After appending the new AI message, ensure total history length is limited
-                # This ensures we always keep the last 5 user messages and their 5 AI responses
-                if len(st.session_state.messages) > 10:
-                    st.session_state.messages = st.session_state.messages[-10:]
-                    logger.info("Chat history truncated to last 10 messages (5 pairs).")
-
-            except Exception as e:
-                error_message = f"An error occurred while processing your request. Please try again. Error: {e}"
-                st.error(error_message)
-                logger.error(f"Error during Streamlit query processing: {e}", exc_info=True)
-                st.session_state.messages.append(AIMessage(content="Sorry, I encountered an error. Please check the logs."))
-                # Ensure history is still limited even on error
-                if len(st.session_state.messages) > 10:
-                    st.session_state.messages = st.session_state.messages[-10:]
+        try:
+            # Pass the current query and the full chat history to the NL2SQLChainManager
+            # We slice the history to exclude the *current* user prompt, as it's already handled
+            # by the 'question' input to the chain. The chat_history should contain previous turns.
+            # The history is further limited to a token budget so the LLM prompt stays small.
+            # (role, content) tuples are hashable, so the history doubles as the cache key;
+            # they are only converted to Langchain messages when the LLM is actually called.
+            history_key = _truncate_by_tokens(tuple(st.session_state.messages)[:-1]) # Exclude current user message
+            # st.write_stream renders chunks as they arrive and returns the full answer
+            response = st.write_stream(_stream_answer(prompt, history_key, nl2sql_chain))
+            st.session_state.messages.append(("assistant", response))
+
+        except Exception as e:
+            error_message = f"An error occurred while processing your request. Please try again. Error: {e}"
+            st.error(error_message)
+            logger.error(f"Error during Streamlit query processing: {e}", exc_info=True)
+            st.session_state.messages.append(("assistant", "Sorry, I encountered an error. Please check the logs."))
+
+    # Checkpoint once per turn, after both messages of the turn are in the history
+    _persist_history(session_id, st.session_state.messages)
 
 
 # --- Clear History Button (Optional) ---
 if st.button("Clear Chat History"):
-    st.session_state.messages = []
+    st.session_state.messages.clear()
+    _persist_history(session_id, st.session_state.messages)
     logger.info("Chat history cleared.")
     st.rerun() # Rerun the app to clear the displayed messages
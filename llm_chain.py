@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 import logging
+from typing import Iterator
 
 # Langchain imports
 from langchain_community.utilities import SQLDatabase
@@ -125,4 +126,36 @@ class NL2SQLChainManager:
             return result.content
         except Exception as e:
             logger.error(f"Error during query processing: {e}")
-            return f"An error occurred while processing your query: {e}"
\ No newline at end of file
+            return f"An error occurred while processing your query: {e}"
+
+    def stream_query(self, natural_language_query: str, chat_history: list) -> Iterator[str]:
+        """
+        Streams the natural language answer to a query chunk by chunk, so the UI can
+        render tokens as soon as the LLM produces them instead of waiting for the full answer.
+
+        Args:
+            natural_language_query (str): The user's current question in natural language.
+            chat_history (list): A list of Langchain message objects (e.g., HumanMessage, AIMessage)
+                                 representing the conversation history.
+
+        Yields:
+            str: Successive pieces of the natural language answer.
+
+        Raises:
+            Exception: Any error raised by the chain is logged and re-raised so the caller
+                       can surface it (a partially streamed answer cannot be replaced by an error string).
+        """
+        logger.info(f"Streaming natural language query: '{natural_language_query}' with history.")
+        chunks = []
+        try:
+            for chunk in self.full_chain.stream({
+                "question": natural_language_query,
+                "chat_history": chat_history
+            }):
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
+        except Exception as e:
+            logger.error(f"Error during query streaming: {e}")
+            raise
+        logger.info(f"Final natural language response: {''.join(chunks)}")
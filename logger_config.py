@@ -1,7 +1,109 @@
 # logger_config.py
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import sys
+from types import MappingProxyType
+from typing import Optional
+
+# Log level names accepted by setup_logging, resolved without reflection on the logging module
+_LEVELS = MappingProxyType({
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+})
+
+# Rotate the log file once it reaches 10 MB, keeping 3 old files
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 3
+
+# Size of the buffer in front of console (stderr) log output (64 KB)
+CONSOLE_BUFFER_SIZE = 64 * 1024
+
+
+class BufferedStderrHandler(logging.StreamHandler):
+    """
+    A console handler that writes to stderr through a block-buffered text wrapper
+    instead of flushing after every record.
+
+    Records at WARNING and above flush immediately so problems show up on the console
+    right away; lower levels are written out when the buffer fills or at exit.
+    """
+    def __init__(self):
+        """
+        Opens a block-buffered text stream on the stderr file descriptor. The stream does not
+        own the descriptor (closefd=False), so closing or garbage-collecting it never closes
+        the process-wide stderr. Falls back to sys.stderr if it has no usable descriptor.
+        """
+        try:
+            stream = open(sys.stderr.fileno(), "w", encoding="utf-8", buffering=CONSOLE_BUFFER_SIZE, closefd=False)
+        except (AttributeError, OSError, ValueError):
+            stream = sys.stderr
+        super().__init__(stream)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Writes the formatted record, flushing only for WARNING and above.
+        """
+        try:
+            msg = self.format(record)
+            self.stream.write(msg + self.terminator)
+            if record.levelno >= logging.WARNING:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+# Records are pushed onto this queue by the logger and written by a background listener thread,
+# so logging calls on the Streamlit script thread never block on formatting or disk I/O.
+_log_queue: queue.Queue = queue.Queue(-1)
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# The configured application logger. Streamlit re-runs app.py on every interaction,
+# so after the first call setup_logging simply returns this.
+_LOGGER_CACHE: Optional[logging.Logger] = None
+
+# Whether the log directory has already been created in this process
+_LOG_DIR_READY = False
+
+
+def _stop_listener() -> None:
+    """
+    Stops the background listener at interpreter exit, writing out any queued records.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def _skip_find_caller(stack_info: bool = False, stacklevel: int = 1) -> tuple:
+    """
+    Replacement for Logger.findCaller that reports an unknown source location
+    instead of walking the call stack for every record.
+    """
+    return "(unknown file)", 0, "(unknown function)", None
+
+
+def _ensure_log_dir(log_dir: str) -> None:
+    """
+    Creates the log directory, issuing the mkdir at most once per process.
+    """
+    global _LOG_DIR_READY
+    if not _LOG_DIR_READY:
+        os.makedirs(log_dir, exist_ok=True)
+        _LOG_DIR_READY = True
+
 
 def setup_logging(
     log_file: str = "nl2sql_app.log",
@@ -10,6 +112,8 @@ def setup_logging(
 ) -> logging.Logger:
     """
     Configures and returns a logger for the application.
+    Logging is configured on the first call only; subsequent calls return the
+    already configured logger and ignore their arguments.
 
     Args:
         log_file (str): The name of the file to which logs will be written.
@@ -20,33 +124,64 @@ def setup_logging(
     Returns:
         logging.Logger: The configured logger instance.
     """
+    global _LOGGER_CACHE, _listener
+    # Logging is configured once per process; later calls reuse the configured logger
+    if _LOGGER_CACHE is not None:
+        return _LOGGER_CACHE
+
     # Create a logger
     logger = logging.getLogger("nl2sql_app")
-    logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
 
-    # Prevent duplicate handlers if called multiple times
-    if not logger.handlers:
-        # Define a common formatter
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
-        )
+    # The logger outlives this module: when Streamlit's watcher re-imports a changed module,
+    # _LOGGER_CACHE starts out empty again but the logger still has its QueueHandler attached
+    # (and its listener running), so reuse it rather than attaching a second handler chain.
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers):
+        _LOGGER_CACHE = logger
+        return logger
+
+    logger.setLevel(_LEVELS.get(log_level.upper(), logging.INFO))
 
-        # Add console handler if requested
-        if console_output:
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
+    # Define a common formatter. The source location (filename:lineno) is only
+    # included when debugging, as it is not needed in regular INFO-level logs.
+    # Only this logger is tuned; process-wide logging settings (which Streamlit's and
+    # other libraries' loggers share) are left alone.
+    if logger.isEnabledFor(logging.DEBUG):
+        log_format = '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+    else:
+        log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        # Without filename:lineno in the format, skip the stack walk that locates the caller
+        logger.findCaller = _skip_find_caller
+    formatter = logging.Formatter(log_format)
 
-        # Add file handler if log_file is provided
-        if log_file:
-            # Ensure the logs directory exists
-            log_dir = "logs"
-            os.makedirs(log_dir, exist_ok=True)
-            file_path = os.path.join(log_dir, log_file)
+    handlers = []
+
+    # Add console handler if requested
+    if console_output:
+        console_handler = BufferedStderrHandler()
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    # Add file handler if log_file is provided
+    if log_file:
+        # Ensure the logs directory exists
+        log_dir = "logs"
+        _ensure_log_dir(log_dir)
+        file_path = os.path.join(log_dir, log_file)
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            file_path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
 
-            file_handler = logging.FileHandler(file_path)
-            file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+    # The output handlers run on the background listener; the logger itself only enqueues records
+    _listener = logging.handlers.QueueListener(_log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    logger.addHandler(logging.handlers.QueueHandler(_log_queue))
 
-    print(f"Logging configured. Level: {log_level.upper()}. Logs will be saved to '{os.path.join('logs', log_file)}' and/or console.")
+    _LOGGER_CACHE = logger
+    logger.debug(
+        "Logging configured: level=%s, file=%s",
+        log_level.upper(), os.path.join("logs", log_file) if log_file else None
+    )
     return logger
\ No newline at end of file